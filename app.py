@@ -2,97 +2,199 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import numpy as np
-from datetime import datetime
-import matplotlib.pyplot as plt
+import os
+import pickle
+import hashlib
+import tempfile
+from datetime import datetime, timedelta
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
 
 # File path for the stocklist.xlsx
 FILE_PATH = 'stocklist.xlsx'
 
-# Function to fetch financial data and calculate growth
-def get_financial_data(symbol):
-    stock = yf.Ticker(symbol)
-    income_statement = stock.financials.T  # Transposed for easier access
-    quarterly_income_statement = stock.quarterly_financials.T  # Quarterly data
-    balance_sheet = stock.balance_sheet.T  # Transposed for easier access
-    cashflow = stock.cashflow.T  # Transposed for easier access
+# Directory for downloaded Yahoo Finance data reused across runs
+CACHE_DIR = 'cache'
+
+# How long a failed (empty) download is remembered before it is retried
+FAILED_DOWNLOAD_TTL = timedelta(hours=1)
+
+# Function to get the cache file for a name and its arguments
+def cache_path(name, args):
+    key = hashlib.sha1(repr(args).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{name}-{key}.pkl")
 
+# Function to read a cached result, None if missing, unreadable or expired; results rejected by
+# is_valid (yfinance reports failed downloads as empty data) expire after FAILED_DOWNLOAD_TTL instead of ttl
+def load_cached(path, ttl, is_valid):
     try:
-        # Safe extraction method using .get() to handle missing data
-        revenue = income_statement.get('Total Revenue', [np.nan])[0]
-        cogs = income_statement.get('Cost Of Revenue', [np.nan])[0]
-        gross_profit = income_statement.get('Gross Profit', [np.nan])[0]
-        operating_income = income_statement.get('Operating Income', [np.nan])[0]
-        net_income = income_statement.get('Net Income', [np.nan])[0]
-        
-        # Extract balance sheet data
-        cash_equivalents = balance_sheet.get('Cash And Cash Equivalents', [np.nan])[0]
-        accounts_receivable = balance_sheet.get('Accounts Receivable', [np.nan])[0]
-        inventory = balance_sheet.get('Inventory', [np.nan])[0]
-        pp_and_e = balance_sheet.get('Property, Plant and Equipment', [np.nan])[0]
-        goodwill = balance_sheet.get('Goodwill', [np.nan])[0]
-        total_assets = balance_sheet.get('Total Assets', [np.nan])[0]
-        total_liabilities = balance_sheet.get('Total Liabilities Net Minority Interest', [np.nan])[0]
-        equity = balance_sheet.get('Total Equity Gross Minority Interest', [np.nan])[0]
-
-        # Profitability Ratios
-        gross_profit_margin = (gross_profit / revenue) * 100 if revenue else np.nan
-        operating_profit_margin = (operating_income / revenue) * 100 if revenue else np.nan
-        net_profit_margin = (net_income / revenue) * 100 if revenue else np.nan
-        roe = (net_income / equity) * 100 if equity else np.nan
-        roa = (net_income / total_assets) * 100 if total_assets else np.nan
-
-        # Liquidity Ratios
-        current_ratio = (balance_sheet.get('Current Assets', [np.nan])[0] /
-                         balance_sheet.get('Current Liabilities', [np.nan])[0]) if balance_sheet.get('Current Liabilities', [np.nan])[0] else np.nan
-        quick_ratio = ((balance_sheet.get('Current Assets', [np.nan])[0] - inventory) /
-                       balance_sheet.get('Current Liabilities', [np.nan])[0]) if balance_sheet.get('Current Liabilities', [np.nan])[0] else np.nan
-
-        # Leverage Ratios
-        debt_to_equity = (total_liabilities / equity) if equity else np.nan
-        debt_to_assets = (total_liabilities / total_assets) if total_assets else np.nan
-
-        # Efficiency Ratios
-        asset_turnover = (revenue / total_assets) if total_assets else np.nan
-        inventory_turnover = (cogs / inventory) if inventory else np.nan
-        receivables_turnover = (revenue / accounts_receivable) if accounts_receivable else np.nan
-
-        # Valuation Ratios
-        pe_ratio = stock.info.get('trailingPE', np.nan)
-        pb_ratio = stock.info.get('priceToBook', np.nan)
-        dividend_yield = stock.info.get('dividendYield', np.nan)
-
-        # Cash Flow Ratios
-        operating_cash_flow = cashflow.get('Operating Cash Flow', [np.nan])[0]
-        free_cash_flow = operating_cash_flow - cashflow.get('Capital Expenditures', [np.nan])[0] if operating_cash_flow and cashflow.get('Capital Expenditures', [np.nan])[0] else np.nan
-
-        # Calculate growth for each financial metric (annual growth)
-        revenue_growth = ((revenue - income_statement.get('Total Revenue', [np.nan])[1]) / income_statement.get('Total Revenue', [np.nan])[1]) * 100 if len(income_statement) > 1 else np.nan
-        cogs_growth = ((cogs - income_statement.get('Cost Of Revenue', [np.nan])[1]) / income_statement.get('Cost Of Revenue', [np.nan])[1]) * 100 if len(income_statement) > 1 else np.nan
-        gross_profit_growth = ((gross_profit - income_statement.get('Gross Profit', [np.nan])[1]) / income_statement.get('Gross Profit', [np.nan])[1]) * 100 if len(income_statement) > 1 else np.nan
-        operating_income_growth = ((operating_income - income_statement.get('Operating Income', [np.nan])[1]) / income_statement.get('Operating Income', [np.nan])[1]) * 100 if len(income_statement) > 1 else np.nan
-        net_income_growth = ((net_income - income_statement.get('Net Income', [np.nan])[1]) / income_statement.get('Net Income', [np.nan])[1]) * 100 if len(income_statement) > 1 else np.nan
-
-        # Price performance (30-day and 1-year)
-        price_history = stock.history(period="1y")
-        price_performance_30d = ((price_history['Close'][-1] - price_history['Close'][0]) / price_history['Close'][0]) * 100
-        price_performance_1y = ((price_history['Close'][-1] - price_history['Close'][0]) / price_history['Close'][0]) * 100
-
-        return {
-            'Symbol': symbol,
-            'Revenue Growth': round(revenue_growth, 2),
-            'Gross Profit Growth': round(gross_profit_growth, 2),
-            'Operating Income Growth': round(operating_income_growth, 2),
-            'Net Income Growth': round(net_income_growth, 2),
-            '30 Day Price Performance': round(price_performance_30d, 2),
-            '1 Year Price Performance': round(price_performance_1y, 2)
-        }
-    except Exception as e:
-        print(f"Error fetching data for {symbol}: {e}")
-        return None
+        age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(path))
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+    except Exception:
+        return None  # Missing or unreadable cache entry (e.g. pickled by another pandas version), fetch again
+    return result if age < (ttl if is_valid(result) else FAILED_DOWNLOAD_TTL) else None
+
+# Function to write a result to the cache, a failed write only means it is fetched again next time
+def store_cached(path, result):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Unique temp file per write, so concurrent sessions (threads of one process) never share one
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(tmp_path, path)  # Atomic so concurrent readers never see a partial file
+    except OSError as e:
+        print(f"Error writing cache file {path}: {e}")
+
+# Decorator to persist a function's result on disk and reuse it until it is older than ttl
+def disk_cache(ttl, is_valid=lambda result: True):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            path = cache_path(func.__name__, args)
+            result = load_cached(path, ttl, is_valid)
+            if result is None:
+                result = func(*args)
+                store_cached(path, result)
+            return result
+        return wrapper
+    return decorator
+
+# Function to download the income statement for a symbol (updated by Yahoo once per quarter)
+@disk_cache(ttl=timedelta(days=7), is_valid=lambda statements: all(frame.shape[1] for frame in statements.values()))
+def get_statements(symbol):
+    stock = yf.Ticker(symbol)
+    return {
+        'financials': stock.financials
+    }
+
+# Function to download the financial statements for all symbols concurrently
+def get_all_statements(symbols, max_workers):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {symbol: executor.submit(get_statements, symbol) for symbol in symbols}
+
+    all_statements = {}
+    for symbol, future in futures.items():
+        try:
+            all_statements[symbol] = future.result()
+        except Exception as e:
+            print(f"Error fetching data for {symbol}: {e}")
+    return all_statements
+
+# Function to extract the raw financial figures needed for the growth calculations
+def get_financial_data(symbol, statements):
+    # Statements have one row per line item and one column per period, most recent first
+    income_statement = statements['financials']
+
+    # Most recent and previous period, each looked up once; .get() handles missing data
+    income_latest = income_statement.iloc[:, 0] if income_statement.shape[1] else pd.Series(dtype=float)
+    income_prev = income_statement.iloc[:, 1] if income_statement.shape[1] > 1 else pd.Series(dtype=float)
+
+    return {
+        'Symbol': symbol,
+        'revenue': income_latest.get('Total Revenue', np.nan),
+        'gross_profit': income_latest.get('Gross Profit', np.nan),
+        'operating_income': income_latest.get('Operating Income', np.nan),
+        'net_income': income_latest.get('Net Income', np.nan),
+        'revenue_prev': income_prev.get('Total Revenue', np.nan),
+        'gross_profit_prev': income_prev.get('Gross Profit', np.nan),
+        'operating_income_prev': income_prev.get('Operating Income', np.nan),
+        'net_income_prev': income_prev.get('Net Income', np.nan)
+    }
+
+# Function to divide element-wise, giving NaN wherever the denominator is zero
+def safe_divide(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.full_like(numerator, np.nan), where=denominator != 0)
+
+# Function to calculate annual growth for all symbols at once, one column per metric
+def compute_metrics(raw_df):
+    raw = {column: raw_df[column].to_numpy(dtype=float, na_value=np.nan) for column in raw_df.columns if column != 'Symbol'}
+
+    metrics = pd.DataFrame({
+        'Revenue Growth': safe_divide(raw['revenue'] - raw['revenue_prev'], raw['revenue_prev']) * 100,
+        'Gross Profit Growth': safe_divide(raw['gross_profit'] - raw['gross_profit_prev'], raw['gross_profit_prev']) * 100,
+        'Operating Income Growth': safe_divide(raw['operating_income'] - raw['operating_income_prev'], raw['operating_income_prev']) * 100,
+        'Net Income Growth': safe_divide(raw['net_income'] - raw['net_income_prev'], raw['net_income_prev']) * 100
+    }, index=raw_df.index)
+
+    return pd.concat([raw_df[['Symbol']], metrics.round(2)], axis=1)
+
+# Number of symbols per multi-symbol price download
+PRICE_CHUNK_SIZE = 10
+
+# Function to download one year of closing prices for all symbols, a chunk of symbols per download;
+# each symbol's prices are cached on their own so a missing ticker cannot keep others from the cache
+def get_price_history(symbols):
+    ttl = timedelta(days=1)
+    price_history = {}
+    for symbol in symbols:
+        close = load_cached(cache_path('get_price_history', (symbol,)), ttl, is_valid=lambda close: not close.empty)
+        if close is not None:
+            price_history[symbol] = close
+
+    missing = [symbol for symbol in symbols if symbol not in price_history]
+    for start in range(0, len(missing), PRICE_CHUNK_SIZE):
+        chunk = missing[start:start + PRICE_CHUNK_SIZE]
+        data = yf.download(chunk, period="1y", group_by='ticker', threads=True, progress=False)
+        tickers = set(data.columns.get_level_values(0))
+        for symbol in chunk:
+            close = data[symbol]['Close'].dropna() if symbol in tickers else pd.Series(dtype=float)
+            store_cached(cache_path('get_price_history', (symbol,)), close)
+            price_history[symbol] = close
+    return price_history
+
+# Lookback windows (in calendar days) for price performance, all sliced from the 1y history
+PRICE_PERFORMANCE_PERIODS = {
+    '30 Day Price Performance': 30,
+    '6 Month Price Performance': 180,
+    '1 Year Price Performance': 365
+}
+
+# Function to calculate price performance for every lookback window from closing prices
+def get_price_performance(close):
+    if close is None or close.empty:
+        return {column: np.nan for column in PRICE_PERFORMANCE_PERIODS}
+
+    prices = close.to_numpy()
+    # Index of the first close on or after each lookback date
+    start_dates = [close.index[-1] - pd.Timedelta(days=days) for days in PRICE_PERFORMANCE_PERIODS.values()]
+    start_prices = prices[close.index.searchsorted(start_dates)]
+    performance = np.round((prices[-1] - start_prices) / start_prices * 100, 2)
+
+    return dict(zip(PRICE_PERFORMANCE_PERIODS, performance))
+
+# Function to format the rows of a PDF table as strings, one list per stock
+def table_rows(df, headers, full_form):
+    # Look up the full name of each column using full_form (abbreviation if no full form)
+    table = df[[full_form.get(col, col) for col in headers]]
+
+    # Round to 2 decimal places and convert every cell to a string at once, NaN shown as N/A
+    values = table.round(2).astype(str).mask(table.isna(), 'N/A')
+    values['Symbol'] = values['Symbol'].str.replace('.NS', '', regex=False)  # Remove .NS from Symbol
+    return values.to_numpy().tolist()
+
+# Function to lay out a table in one pass and draw it below y_position, returning the new y position
+def draw_table(c, data, column_widths, y_position):
+    table = Table(data, colWidths=column_widths, rowHeights=20)
+    table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('VALIGN', (0, 0), (-1, -1), 'BOTTOM')
+    ]))
+    _, height = table.wrapOn(c, sum(column_widths), y_position)
+    if y_position - height < 100:
+        c.showPage()
+        y_position = 750
+    table.drawOn(c, 30, y_position - height)
+    return y_position - height
 
 # Function to generate PDF report with fixed table alignment and other adjustments
 def generate_pdf(results_df, index_name, analyst_name):
@@ -128,66 +230,20 @@ def generate_pdf(results_df, index_name, analyst_name):
     }
 
     column_widths = [80, 100, 100, 100, 100, 120, 120]
-    
-    # Draw the column headers
-    for i, header in enumerate(headers):
-        c.drawString(30 + sum(column_widths[:i]), y_position, header)
-    y_position -= 20
-
-    # Add data rows for Top 5 Revenue Growth
-    for index, row in results_df.sort_values(by='Revenue Growth', ascending=False).head(5).iterrows():
-        # Remove .NS from Symbol
-        symbol = row['Symbol'].replace('.NS', '')
-        
-        # Access the value of the full column name directly
-        for i, col in enumerate(headers):
-            # Look up the full name of the column using full_form
-            column_name = full_form.get(col, col)  # Get full form name if exists, else use abbreviation
 
-            value = row[column_name] if isinstance(row[column_name], (int, float)) else str(row[column_name])
-
-            if isinstance(value, (int, float)):
-                value = round(value, 2)  # Round to 2 decimal places
-            else:
-                value = 'N/A' if pd.isna(value) else value  # Handle NaN and non-numeric values
-
-            c.drawString(30 + sum(column_widths[:i]), y_position, str(value))
-        y_position -= 20
-        if y_position < 100:
-            c.showPage()
-            y_position = 750
+    # Add table for Top 5 Revenue Growth
+    top_revenue_growth = results_df.dropna(subset=['Revenue Growth']).nlargest(5, 'Revenue Growth')
+    y_position = draw_table(c, [headers] + table_rows(top_revenue_growth, headers, full_form), column_widths, y_position)
 
     # Insert Top 5 Stocks with Lowest Price Performance
     c.setFont("Helvetica-Bold", 14)
     c.drawString(30, y_position - 20, "Top 5 Stocks with Lowest Price Performance in Last 1 Month")
     c.setFont("Helvetica", 10)
     y_position -= 40
-    for i, header in enumerate(headers):
-        c.drawString(30 + sum(column_widths[:i]), y_position, header)
-    y_position -= 20
-
-    # Add data rows for Lowest Price Performance
-    for index, row in results_df.sort_values(by='30 Day Price Performance').head(5).iterrows():
-        # Remove .NS from Symbol
-        symbol = row['Symbol'].replace('.NS', '')
-        
-        # Access the value of the full column name directly
-        for i, col in enumerate(headers):
-            # Look up the full name of the column using full_form
-            column_name = full_form.get(col, col)  # Get full form name if exists, else use abbreviation
 
-            value = row[column_name] if isinstance(row[column_name], (int, float)) else str(row[column_name])
-
-            if isinstance(value, (int, float)):
-                value = round(value, 2)  # Round to 2 decimal places
-            else:
-                value = 'N/A' if pd.isna(value) else value  # Handle NaN and non-numeric values
-
-            c.drawString(30 + sum(column_widths[:i]), y_position, str(value))
-        y_position -= 20
-        if y_position < 100:
-            c.showPage()
-            y_position = 750
+    # Add table for Lowest Price Performance
+    lowest_price_performance = results_df.dropna(subset=['30 Day Price Performance']).nsmallest(5, '30 Day Price Performance')
+    y_position = draw_table(c, [headers] + table_rows(lowest_price_performance, headers, full_form), column_widths, y_position)
 
     # Footer with Full Forms of Shortened Names
     c.setFont("Helvetica", 8)
@@ -208,11 +264,15 @@ def generate_pdf(results_df, index_name, analyst_name):
 
 
 
+# Function to read every sheet of the Excel file once and keep it across reruns
+@st.cache_data
+def load_stocklist():
+    return pd.read_excel(FILE_PATH, sheet_name=None)
+
 # Function to get stock symbols from the Excel file
 def get_stock_symbols(sheet_name):
-    xl = pd.ExcelFile(FILE_PATH)
-    df = xl.parse(sheet_name)
-    return df['Symbol'].tolist()
+    df = load_stocklist()[sheet_name]
+    return df['Symbol'].dropna().tolist()
 
 # Streamlit Dashboard UI
 def main():
@@ -223,28 +283,38 @@ def main():
     
     # Research Analyst Name
     analyst_name = st.text_input("Research Analyst Name")
+
+    # Number of symbols fetched concurrently from Yahoo Finance
+    max_workers = st.slider("Parallel Downloads", min_value=1, max_value=32, value=16)
     
     # Analyze Stocks Button
     if st.button("Analyze Stocks"):
+        # Validate input before starting any downloads
+        if not analyst_name.strip():
+            st.error("Please enter the Research Analyst Name")
+            st.stop()
+
         symbols = get_stock_symbols(sheet_name)
-        results = []
-        
-        # Fetch financial data for each symbol
-        for symbol in symbols:
-            stock_data = get_financial_data(symbol)
-            if stock_data:
-                results.append(stock_data)
         
-        # Convert results to DataFrame
-        results_df = pd.DataFrame(results)
+        # Download statements for all symbols up front, then extract figures locally
+        all_statements = get_all_statements(symbols, max_workers)
+        raw_data = [get_financial_data(symbol, statements) for symbol, statements in all_statements.items()]
+
+        # Calculate every growth figure as a column over all symbols at once
+        results_df = compute_metrics(pd.DataFrame(raw_data))
+
+        # Price history for every symbol comes from chunked multi-symbol downloads
+        price_history = get_price_history(symbols)
+        price_performance = [get_price_performance(price_history.get(symbol)) for symbol in results_df['Symbol']]
+        results_df = results_df.join(pd.DataFrame(price_performance, index=results_df.index))
         
         # Display the results in a table
         st.subheader(f"Top 5 Stocks with Highest Revenue Growth")
-        top_stocks_revenue_growth = results_df.sort_values(by='Revenue Growth', ascending=False).head(5)
+        top_stocks_revenue_growth = results_df.dropna(subset=['Revenue Growth']).nlargest(5, 'Revenue Growth')
         st.dataframe(top_stocks_revenue_growth[['Symbol', 'Revenue Growth', 'Gross Profit Growth', 'Operating Income Growth', 'Net Income Growth', '30 Day Price Performance', '1 Year Price Performance']])
         
         st.subheader(f"Top 5 Stocks with Lowest Price Performance in Last 1 Month")
-        top_stocks_price_performance = results_df.sort_values(by='30 Day Price Performance').head(5)
+        top_stocks_price_performance = results_df.dropna(subset=['30 Day Price Performance']).nsmallest(5, '30 Day Price Performance')
         st.dataframe(top_stocks_price_performance[['Symbol', '30 Day Price Performance', 'Revenue Growth', 'Net Income Growth', 'Operating Income Growth']])
         
         # Generate PDF report and download link